@@ -0,0 +1,38 @@
+"""Cascade delete ReviewSchedule when its LearningItem is deleted
+
+Revision ID: 7b4e2c9a1d85
+Revises: 3f2a7d1b6c40
+Create Date: 2026-10-15 11:03:47.208615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b4e2c9a1d85'
+down_revision: Union[str, None] = '3f2a7d1b6c40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 初期マイグレーションの外部キーは無名のため、batchモードで名前を付けて再作成する
+naming_convention = {
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+}
+fk_name = 'fk_review_schedules_learning_item_id_learning_items'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('review_schedules', recreate='always', naming_convention=naming_convention) as batch_op:
+        batch_op.drop_constraint(fk_name, type_='foreignkey')
+        batch_op.create_foreign_key(fk_name, 'learning_items', ['learning_item_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('review_schedules', recreate='always', naming_convention=naming_convention) as batch_op:
+        batch_op.drop_constraint(fk_name, type_='foreignkey')
+        batch_op.create_foreign_key(fk_name, 'learning_items', ['learning_item_id'], ['id'])
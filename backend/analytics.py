@@ -1,32 +1,37 @@
 import numpy as np
 from datetime import datetime, timedelta
 from typing import List, Dict
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, distinct
+from cachetools import TTLCache
 from models import ReviewSchedule, LearningItem
 
-def analyze_learning_pattern(db: Session, user_id: int):
-    # 総学習項目数を取得
-    total_items = db.query(LearningItem).filter(
-        LearningItem.user_id == user_id
-    ).count()
-
-    # 復習完了率を計算
-    all_schedules = db.query(ReviewSchedule).join(
-        LearningItem
-    ).filter(
-        LearningItem.user_id == user_id,
-        ReviewSchedule.is_deleted == False
-    ).count()
-
-    completed_schedules = db.query(ReviewSchedule).join(
-        LearningItem
-    ).filter(
-        LearningItem.user_id == user_id,
-        ReviewSchedule.completed.isnot(None),
-        ReviewSchedule.is_deleted == False
-    ).count()
+# 基本の復習間隔（時間）: 1時間後、1日後、3日後、1週間後、2週間後、1ヶ月後
+BASE_INTERVALS = (1, 24, 72, 168, 336, 720)
 
+# 完了率の区分ごとの間隔調整係数
+_ADJUSTMENT_BY_BUCKET = {
+    "low": 0.8,   # 間隔を短く
+    "mid": 1.0,
+    "high": 1.2,  # 間隔を長く
+}
+
+BASE_INTERVALS_ARRAY = np.array(BASE_INTERVALS, dtype=np.float64)
+
+# 区分ごとの調整済み間隔（時間単位に切り捨て、起動時に一度だけtimedeltaとして計算）
+_TIMEDELTAS_BY_BUCKET = {
+    bucket: tuple(timedelta(hours=int(interval * adjustment)) for interval in BASE_INTERVALS)
+    for bucket, adjustment in _ADJUSTMENT_BY_BUCKET.items()
+}
+
+# ユーザーごとの集計件数キャッシュ [総学習項目数, 有効な復習数, 完了済みの復習数]
+# （30秒で失効、作成時は件数を直接加算し、完了・キャンセル・削除時は破棄）
+_ANALYTICS_CACHE = TTLCache(maxsize=10_000, ttl=30)
+# ユーザーごとのキャッシュ世代（キャッシュの書き込み・破棄のたびに進め、
+# 集計中や作成中に古くなった件数を書き戻さない）
+_ANALYTICS_GENERATIONS: Dict[int, int] = {}
+
+def _summarize(total_items: int, all_schedules: int, completed_schedules: int):
     completion_rate = (completed_schedules / all_schedules * 100) if all_schedules > 0 else 0
 
     return {
@@ -34,12 +39,66 @@ def analyze_learning_pattern(db: Session, user_id: int):
         "completion_rate": round(completion_rate, 1)
     }
 
-def optimize_review_intervals(completion_rate: float, base_intervals: list):
-    # 完了率に基づいて間隔を調整
-    adjustment = 1.0
+async def analyze_learning_pattern(db: AsyncSession, user_id: int):
+    cached = _ANALYTICS_CACHE.get(user_id)
+    if cached is not None:
+        return _summarize(*cached)
+
+    generation = learning_pattern_generation(user_id)
+
+    # 総学習項目数と復習完了率を1回のクエリで集計
+    total_items, all_schedules, completed_schedules = (await db.execute(
+        select(
+            func.count(distinct(LearningItem.id)),
+            func.count(ReviewSchedule.id).filter(
+                ReviewSchedule.is_deleted == False
+            ),
+            func.count(ReviewSchedule.id).filter(
+                ReviewSchedule.is_deleted == False,
+                ReviewSchedule.completed.isnot(None)
+            )
+        ).select_from(LearningItem).outerjoin(
+            ReviewSchedule
+        ).where(
+            LearningItem.user_id == user_id
+        )
+    )).one()
+
+    # 集計中に他のリクエストが書き込みを行っていれば、古い件数はキャッシュしない
+    if learning_pattern_generation(user_id) == generation:
+        _ANALYTICS_CACHE[user_id] = [total_items, all_schedules, completed_schedules]
+        _ANALYTICS_GENERATIONS[user_id] = generation + 1
+    return _summarize(total_items, all_schedules, completed_schedules)
+
+def learning_pattern_generation(user_id: int):
+    return _ANALYTICS_GENERATIONS.get(user_id, 0)
+
+def record_learning_item_created(user_id: int, schedule_count: int, generation: int):
+    # 学習項目の作成をコミットした後に呼び出す
+    # generation はコミット前に learning_pattern_generation で取得した値
+    counts = _ANALYTICS_CACHE.get(user_id)
+    if counts is None or learning_pattern_generation(user_id) != generation:
+        # その間にキャッシュが入れ替わっていれば、今回の作成を含むか判断できないので破棄
+        invalidate_learning_pattern(user_id)
+        return
+    # 同じリストを更新するので失効時刻は延びない
+    counts[0] += 1
+    counts[1] += schedule_count
+    _ANALYTICS_GENERATIONS[user_id] = generation + 1
+
+def invalidate_learning_pattern(user_id: int):
+    # 復習の完了・キャンセル、学習項目の削除後に呼び出す
+    _ANALYTICS_GENERATIONS[user_id] = learning_pattern_generation(user_id) + 1
+    _ANALYTICS_CACHE.pop(user_id, None)
+
+def completion_rate_bucket(completion_rate: float):
+    # 完了率を区分に分類
     if completion_rate < 50:
-        adjustment = 0.8  # 間隔を短く
-    elif completion_rate > 80:
-        adjustment = 1.2  # 間隔を長く
+        return "low"
+    if completion_rate > 80:
+        return "high"
+    return "mid"
 
-    return [int(interval * adjustment) for interval in base_intervals] 
\ No newline at end of file
+def optimize_review_timedeltas(completion_rate: float):
+    # 完了率に基づいて調整済みの間隔をtimedeltaで返す
+    return _TIMEDELTAS_BY_BUCKET[completion_rate_bucket(completion_rate)]
@@ -0,0 +1,32 @@
+import numpy as np
+from numba import config as numba_config, njit, prange
+from analytics import BASE_INTERVALS_ARRAY
+
+# 複数ユーザー分の復習間隔をまとめて計算するバッチ処理用
+# numbaの読み込みとJITコンパイルが重いので、リクエスト処理からはimportしない
+
+# TBBの並列レイヤーはワーカースレッドから呼ぶと終了時にハングするためOpenMPを優先
+numba_config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _scale_intervals(base, rates, out):
+    # 区分の境界・係数は analytics.completion_rate_bucket / _ADJUSTMENT_BY_BUCKET と同じ
+    for u in prange(rates.size):
+        adjustment = 1.0
+        if rates[u] < 50:
+            adjustment = 0.8
+        elif rates[u] > 80:
+            adjustment = 1.2
+        for k in range(base.size):
+            out[u, k] = int(base[k] * adjustment)
+
+def optimize_review_intervals_batch(completion_rates):
+    # 複数ユーザーの完了率から調整済み間隔を一括計算（行: ユーザー、列: 復習回）
+    rates = np.asarray(completion_rates, dtype=np.float64)
+    out = np.empty((rates.size, BASE_INTERVALS_ARRAY.size), dtype=np.int64)
+    _scale_intervals(BASE_INTERVALS_ARRAY, rates, out)
+    return out
+
+def warm_up_interval_scaling():
+    # バッチ処理の開始前に呼び出し、初回のJITコンパイルを済ませておく
+    optimize_review_intervals_batch(np.zeros(1))
@@ -1,19 +1,62 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./learning_reminder.db"
+# Alembicなど同期処理用のURL
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./learning_reminder.db")
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+# アプリケーションは同じDBに非同期ドライバで接続
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+_url = make_url(SQLALCHEMY_DATABASE_URL)
+ASYNC_DATABASE_URL = _url.set(
+    drivername=_ASYNC_DRIVERS.get(_url.get_backend_name(), _url.drivername)
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+if IS_SQLITE:
+    # aiosqliteの既定はNullPoolのため、接続（とPRAGMA設定）を使い回すようプールを明示
+    engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        poolclass=AsyncAdaptedQueuePool,
+        query_cache_size=1200
+    )
+else:
+    # PostgreSQLなどはコネクションプールを広めに確保
+    engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=20,
+        max_overflow=10,
+        pool_pre_ping=True,
+        query_cache_size=1200
+    )
+
+# SQLiteの接続ごとの設定
+# - 外部キー制約（ON DELETE CASCADE）の有効化
+# - WALモードで読み込みと書き込みを並行させる
+# - ページキャッシュをメモリマップで保持
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    if not IS_SQLITE:
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+# 非同期ではコミット後の遅延ロードができないため、属性を失効させない
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close() 
\ No newline at end of file
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
\ No newline at end of file
@@ -1,28 +1,55 @@
 from fastapi import FastAPI, HTTPException, Depends, status, Body
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from typing import List
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timezone
+from typing import List, Optional
 import numpy as np
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 import logging
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import os
 
-# パスワードハッシュ化の設定
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# パスワードハッシュ化の設定（ラウンド数は環境変数 BCRYPT_ROUNDS で調整可能）
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
-# ロギングの設定
-logging.basicConfig(level=logging.INFO)
+# ロギングの設定（本番はWARNING、開発時は LOG_LEVEL=DEBUG などで詳細を出力）
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
 logger = logging.getLogger(__name__)
 
 from database import get_db, engine, Base
 from models import User, LearningItem, ReviewSchedule
-from analytics import analyze_learning_pattern, optimize_review_intervals
+from analytics import (
+    BASE_INTERVALS_ARRAY,
+    analyze_learning_pattern,
+    invalidate_learning_pattern,
+    learning_pattern_generation,
+    optimize_review_timedeltas,
+    record_learning_item_created,
+)
 
-# データベーステーブルの作成
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # データベーステーブルの作成
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    # プール内の接続を閉じる（aiosqliteの接続スレッドを残さない）
+    await engine.dispose()
 
-app = FastAPI(title="Learning Reminder API")
+# datetimeはorjsonがISO 8601形式で直接シリアライズする
+app = FastAPI(
+    title="Learning Reminder API",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
 
 # CORS設定
 app.add_middleware(
@@ -37,65 +64,96 @@ app.add_middleware(
 class LearningItemCreate(BaseModel):
     title: str
     content: str
-    learning_date: str
+    learning_date: datetime
     user_id: int
 
+    @field_validator("learning_date")
+    @classmethod
+    def to_naive_utc(cls, value: datetime):
+        # DBはタイムゾーンなしで保存するため、UTCに変換してから渡す
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
 class UserCreate(BaseModel):
     email: str
     password: str
 
-# 基本の復習間隔（時間）
-BASE_INTERVALS = [1, 24, 72, 168, 336, 720]
+# レスポンスのシリアライズ用モデル
+class LearningItemCreated(BaseModel):
+    message: str
+    item_id: int
+    title: str
+    learning_date: datetime
+
+class LearningItemOut(BaseModel):
+    id: int
+    title: str
+    content: str
+    learning_date: datetime
+    user_id: int
+
+class ReviewScheduleOut(BaseModel):
+    id: int
+    review_number: int
+    review_date: datetime
+    completed: bool
+    completed_at: Optional[datetime]
+    is_deleted: bool
+
+class ReviewScheduleList(BaseModel):
+    schedules: List[ReviewScheduleOut]
+
+# 1時間あたりのマイクロ秒
+_US_PER_HOUR = 3_600_000_000
 
 @app.post("/calculate-reviews")
-async def calculate_reviews(learning_date: str, repetition_number: int = 0, db: Session = Depends(get_db)):
+async def calculate_reviews(learning_date: str, repetition_number: int = 0, db: AsyncSession = Depends(get_db)):
     try:
         date = datetime.fromisoformat(learning_date)
-        # 基本の復習間隔（時間）: 1時間後、1日後、3日後、1週間後、2週間後、1ヶ月後
-        base_intervals = [1, 24, 72, 168, 336, 720]
-        
+
         # 学習回数に応じて間隔を調整（学習回数が増えるほど間隔を広げる）
-        adjusted_intervals = [interval * (1 + 0.1 * repetition_number) for interval in base_intervals]
-        
-        # 復習日時のリストを生成
-        review_dates = [
-            date + timedelta(hours=interval)
-            for interval in adjusted_intervals
-        ]
-        
+        adjusted_intervals = BASE_INTERVALS_ARRAY * (1.0 + 0.1 * repetition_number)
+
+        # 復習日時のリストをまとめて生成（タイムゾーンは計算後に戻す）
+        review_dates = (
+            np.datetime64(date.replace(tzinfo=None), "us")
+            + np.rint(adjusted_intervals * _US_PER_HOUR).astype("timedelta64[us]")
+        ).tolist()
+
         return {
             "review_schedule": [
                 {
                     "review_number": i + 1,
-                    "review_date": review_date.isoformat(),
+                    "review_date": review_date.replace(tzinfo=date.tzinfo),
                     "interval_hours": interval,
                     "completed": False,
                     "is_deleted": False
                 }
-                for i, (review_date, interval) in enumerate(zip(review_dates, adjusted_intervals))
+                for i, (review_date, interval) in enumerate(zip(review_dates, adjusted_intervals.tolist()))
             ]
         }
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format")
 
-@app.post("/learning-items/")
+@app.post("/learning-items/", response_model=LearningItemCreated)
 async def create_learning_item(
     item: LearningItemCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     try:
-        logger.info(f"Received learning item: {item}")
+        logger.debug("Received learning item: %s", item)
         
-        # 文字列の日時をdatetimeオブジェクトに変換
-        learning_date = datetime.fromisoformat(item.learning_date)
+        learning_date = item.learning_date
         
         # ユーザーの学習パターンを分析
-        analytics = analyze_learning_pattern(db, item.user_id)
-        logger.info(f"Analytics result: {analytics}")
+        analytics = await analyze_learning_pattern(db, item.user_id)
+        logger.debug("Analytics result: %s", analytics)
         
         # 復習間隔を最適化
-        intervals = optimize_review_intervals(analytics["completion_rate"], BASE_INTERVALS)
-        logger.info(f"Optimized intervals: {intervals}")
+        intervals = optimize_review_timedeltas(analytics["completion_rate"])
+        logger.debug("Optimized intervals: %s", intervals)
+        analytics_generation = learning_pattern_generation(item.user_id)
         
         # 学習アイテムの作成
         db_item = LearningItem(
@@ -105,168 +163,221 @@ async def create_learning_item(
             user_id=item.user_id
         )
         db.add(db_item)
-        db.flush()
-        logger.info(f"Created learning item with ID: {db_item.id}")
+        await db.flush()
+        logger.debug("Created learning item with ID: %s", db_item.id)
         
         # 復習スケジュールの作成
-        review_dates = [
-            learning_date + timedelta(hours=interval)
-            for interval in intervals
-        ]
-        
-        for i, review_date in enumerate(review_dates, 1):
-            db_schedule = ReviewSchedule(
-                learning_item_id=db_item.id,
-                review_number=i,
-                review_date=review_date
-            )
-            db.add(db_schedule)
-        
-        db.commit()
-        logger.info("Successfully committed to database")
+        await db.execute(insert(ReviewSchedule), [
+            {
+                "learning_item_id": db_item.id,
+                "review_number": i,
+                "review_date": learning_date + interval
+            }
+            for i, interval in enumerate(intervals, 1)
+        ])
+
+        await db.commit()
+        # 次の作成で再集計しないよう、キャッシュ済みの件数に今回の分を加算
+        record_learning_item_created(item.user_id, len(intervals), analytics_generation)
+        logger.debug("Successfully committed to database")
         
         return {
             "message": "学習アイテムを作成しました",
             "item_id": db_item.id,
             "title": db_item.title,
-            "learning_date": db_item.learning_date.isoformat()
+            "learning_date": db_item.learning_date
         }
+    except IntegrityError as e:
+        # user_id の外部キー制約違反（存在しないユーザー）
+        logger.warning("Integrity error: %s", e)
+        raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
     except ValueError as e:
-        logger.error(f"Value error: {str(e)}")
+        logger.error("Value error: %s", e)
         raise HTTPException(status_code=400, detail=f"Invalid data format: {str(e)}")
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
+        logger.error("Unexpected error: %s", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.get("/learning-items/{user_id}")
-async def get_learning_items(user_id: int, db: Session = Depends(get_db)):
+@app.get("/learning-items/{user_id}", response_model=List[LearningItemOut])
+async def get_learning_items(user_id: int, db: AsyncSession = Depends(get_db)):
     try:
-        items = db.query(LearningItem).filter(LearningItem.user_id == user_id).all()
-        # IDで一意に
-        unique = {item.id: item for item in items}.values()
+        # 必要な列だけを取得（ORMオブジェクトを生成しない）
+        items = (await db.execute(
+            select(
+                LearningItem.id,
+                LearningItem.title,
+                LearningItem.content,
+                LearningItem.learning_date,
+                LearningItem.user_id
+            ).where(LearningItem.user_id == user_id)
+        )).all()
         return [
             {
                 "id": item.id,
                 "title": item.title,
                 "content": item.content,
-                "learning_date": item.learning_date.isoformat(),
+                "learning_date": item.learning_date,
                 "user_id": item.user_id
             }
-            for item in unique
+            for item in items
         ]
     except Exception as e:
-        logger.error(f"Error fetching learning items: {str(e)}")
+        logger.error("Error fetching learning items: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+# 更新した復習スケジュールの所有者ID（RETURNING でキャッシュ破棄用に返す）
+_SCHEDULE_OWNER_ID = (
+    select(LearningItem.user_id)
+    .where(LearningItem.id == ReviewSchedule.learning_item_id)
+    .correlate(ReviewSchedule)
+    .scalar_subquery()
+)
+
 @app.post("/review-complete/{schedule_id}")
 async def complete_review(
     schedule_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    schedule = db.query(ReviewSchedule).filter(ReviewSchedule.id == schedule_id).first()
-    if not schedule:
+    completed_at = datetime.utcnow()
+    # 更新と所有者IDの取得を1回のクエリで行い、対象がなければ404
+    owner = (await db.execute(
+        update(ReviewSchedule)
+        .where(ReviewSchedule.id == schedule_id)
+        .values(completed=completed_at)
+        .returning(_SCHEDULE_OWNER_ID.label("user_id"))
+    )).first()
+    if owner is None:
         raise HTTPException(status_code=404, detail="スケジュールが見つかりません")
-    
-    schedule.completed = datetime.utcnow()
-    db.commit()
+    await db.commit()
+    invalidate_learning_pattern(owner.user_id)
     
     return {
         "message": "復習を完了しました",
         "completed": True,
-        "completed_at": schedule.completed.isoformat()
+        "completed_at": completed_at
     }
 
 @app.post("/review-delete/{schedule_id}")
 async def delete_review(
     schedule_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    schedule = db.query(ReviewSchedule).filter(ReviewSchedule.id == schedule_id).first()
-    if not schedule:
+    # 更新と所有者IDの取得を1回のクエリで行い、対象がなければ404
+    owner = (await db.execute(
+        update(ReviewSchedule)
+        .where(ReviewSchedule.id == schedule_id)
+        .values(is_deleted=True)
+        .returning(_SCHEDULE_OWNER_ID.label("user_id"))
+    )).first()
+    if owner is None:
         raise HTTPException(status_code=404, detail="スケジュールが見つかりません")
-    
-    schedule.is_deleted = True
-    db.commit()
+    await db.commit()
+    invalidate_learning_pattern(owner.user_id)
     
     return {
         "message": "復習をキャンセルしました",
         "is_deleted": True
     }
 
-@app.get("/review-schedules/{learning_item_id}")
+@app.get("/review-schedules/{learning_item_id}", response_model=ReviewScheduleList)
 async def get_review_schedules(
     learning_item_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    schedules = db.query(ReviewSchedule).filter(
-        ReviewSchedule.learning_item_id == learning_item_id,
-        ReviewSchedule.is_deleted == False
-    ).all()
+    # 必要な列だけを取得（ORMオブジェクトを生成しない）
+    schedules = (await db.execute(
+        select(
+            ReviewSchedule.id,
+            ReviewSchedule.review_number,
+            ReviewSchedule.review_date,
+            ReviewSchedule.completed.isnot(None).label("completed"),
+            ReviewSchedule.completed.label("completed_at")
+        ).where(
+            ReviewSchedule.learning_item_id == learning_item_id,
+            ReviewSchedule.is_deleted == False
+        )
+    )).all()
     
     return {
         "schedules": [
             {
                 "id": schedule.id,
                 "review_number": schedule.review_number,
-                "review_date": schedule.review_date.isoformat(),
-                "completed": schedule.completed is not None,
-                "completed_at": schedule.completed.isoformat() if schedule.completed else None,
-                "is_deleted": schedule.is_deleted
+                "review_date": schedule.review_date,
+                "completed": schedule.completed,
+                "completed_at": schedule.completed_at,
+                # 削除済みは除外しているので常にFalse
+                "is_deleted": False
             }
             for schedule in schedules
         ]
     }
 
 @app.get("/analytics/{user_id}")
-async def get_analytics(user_id: int, db: Session = Depends(get_db)):
-    return analyze_learning_pattern(db, user_id)
+async def get_analytics(user_id: int, db: AsyncSession = Depends(get_db)):
+    return await analyze_learning_pattern(db, user_id)
+
+async def insert_user_if_absent(db: AsyncSession, email: str, hashed_password: str):
+    # INSERT ... ON CONFLICT (email) DO NOTHING RETURNING id を1文で実行
+    # 既に存在する場合は None を返す
+    if db.get_bind().dialect.name == "postgresql":
+        upsert = pg_insert
+    else:
+        upsert = sqlite_insert
+    stmt = upsert(User).values(
+        email=email,
+        hashed_password=hashed_password
+    ).on_conflict_do_nothing(
+        index_elements=["email"]
+    ).returning(User.id)
+    return await db.scalar(stmt)
+
+async def get_user_id_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(User.id).where(User.email == email))
 
 @app.post("/users/")
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     try:
-        # 既存のユーザーをチェック
-        existing_user = db.query(User).filter(User.email == user.email).first()
-        if existing_user:
-            return {"message": "ユーザーは既に存在します", "user_id": existing_user.id}
-
-        # 新しいユーザーを作成
-        hashed_password = pwd_context.hash(user.password)
-        db_user = User(
-            email=user.email,
-            hashed_password=hashed_password
-        )
-        db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        # 既存のユーザーをチェック（重いハッシュ計算の前に行う）
+        existing_id = await get_user_id_by_email(db, user.email)
+        if existing_id is not None:
+            return {"message": "ユーザーは既に存在します", "user_id": existing_id}
+
+        # bcryptは重いのでイベントループをブロックしないようスレッドプールで実行
+        hashed_password = await run_in_threadpool(pwd_context.hash, user.password)
+
+        # 新しいユーザーを作成（同時リクエストで先に作成された場合は何もしない）
+        user_id = await insert_user_if_absent(db, user.email, hashed_password)
+        if user_id is None:
+            return {"message": "ユーザーは既に存在します", "user_id": await get_user_id_by_email(db, user.email)}
+        await db.commit()
         
-        logger.info(f"Created new user with ID: {db_user.id}")
-        return {"message": "ユーザーを作成しました", "user_id": db_user.id}
+        logger.info("Created new user with ID: %s", user_id)
+        return {"message": "ユーザーを作成しました", "user_id": user_id}
     except Exception as e:
-        logger.error(f"Error creating user: {str(e)}")
+        logger.error("Error creating user: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/users/test")
-async def create_test_user(db: Session = Depends(get_db)):
+async def create_test_user(db: AsyncSession = Depends(get_db)):
     try:
         # テストユーザーを作成
         test_email = "test@example.com"
-        existing_user = db.query(User).filter(User.email == test_email).first()
-        
-        if existing_user:
-            return {"message": "テストユーザーは既に存在します", "user_id": existing_user.id}
+        existing_id = await get_user_id_by_email(db, test_email)
+        if existing_id is not None:
+            return {"message": "テストユーザーは既に存在します", "user_id": existing_id}
+
+        hashed_password = await run_in_threadpool(pwd_context.hash, "testpassword")
+        user_id = await insert_user_if_absent(db, test_email, hashed_password)
         
-        test_user = User(
-            email=test_email,
-            hashed_password=pwd_context.hash("testpassword")
-        )
-        db.add(test_user)
-        db.commit()
-        db.refresh(test_user)
+        if user_id is None:
+            return {"message": "テストユーザーは既に存在します", "user_id": await get_user_id_by_email(db, test_email)}
+        await db.commit()
         
-        logger.info(f"Created test user with ID: {test_user.id}")
-        return {"message": "テストユーザーを作成しました", "user_id": test_user.id}
+        logger.info("Created test user with ID: %s", user_id)
+        return {"message": "テストユーザーを作成しました", "user_id": user_id}
     except Exception as e:
-        logger.error(f"Error creating test user: {str(e)}")
+        logger.error("Error creating test user: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/")
@@ -274,12 +385,13 @@ async def root():
     return {"message": "Learning Reminder API"}
 
 @app.delete("/learning-items/{item_id}")
-async def delete_learning_item(item_id: int, db: Session = Depends(get_db)):
-    item = db.query(LearningItem).filter(LearningItem.id == item_id).first()
-    if not item:
+async def delete_learning_item(item_id: int, db: AsyncSession = Depends(get_db)):
+    # 関連する復習スケジュールは ON DELETE CASCADE で削除される
+    deleted = (await db.execute(
+        delete(LearningItem).where(LearningItem.id == item_id).returning(LearningItem.user_id)
+    )).first()
+    if deleted is None:
         raise HTTPException(status_code=404, detail="学習項目が見つかりません")
-    # 関連する復習スケジュールも削除
-    db.query(ReviewSchedule).filter(ReviewSchedule.learning_item_id == item_id).delete()
-    db.delete(item)
-    db.commit()
+    await db.commit()
+    invalidate_learning_pattern(deleted.user_id)
     return {"message": "学習項目を削除しました"} 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Boolean, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -19,17 +19,22 @@ class LearningItem(Base):
     title = Column(String, index=True)
     content = Column(String)
     learning_date = Column(DateTime)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     user = relationship("User", back_populates="learning_items")
-    review_schedules = relationship("ReviewSchedule", back_populates="learning_item")
+    review_schedules = relationship("ReviewSchedule", back_populates="learning_item", passive_deletes=True)
 
 class ReviewSchedule(Base):
     __tablename__ = "review_schedules"
 
     id = Column(Integer, primary_key=True, index=True)
-    learning_item_id = Column(Integer, ForeignKey("learning_items.id"))
+    learning_item_id = Column(Integer, ForeignKey("learning_items.id", ondelete="CASCADE"))
     review_number = Column(Integer)
     review_date = Column(DateTime)
     completed = Column(DateTime, nullable=True)
     is_deleted = Column(Boolean, default=False)
-    learning_item = relationship("LearningItem", back_populates="review_schedules") 
\ No newline at end of file
+    learning_item = relationship("LearningItem", back_populates="review_schedules") 
+
+    __table_args__ = (
+        Index("ix_review_schedules_item_deleted", "learning_item_id", "is_deleted"),
+        Index("ix_review_schedules_deleted_completed", "is_deleted", "completed"),
+    )